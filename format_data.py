@@ -1,17 +1,44 @@
+import os
+import argparse
+import numpy as np
 import pandas as pd
+from time import perf_counter, sleep
 from datetime import time
 from itertools import combinations
 from collections import Counter
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
 import matplotlib.pyplot as plt
 from matplotlib.backends.backend_pdf import PdfPages
 from matplotlib import gridspec
 
 file_path_square = './data/items-2023-11-01-2023-12-01.csv'
 file_path_toast = './data/ItemSelectionDetails_2023_11_14-2023_12_13.csv'
-square_df = pd.read_csv(file_path_square)
-toast_df = pd.read_csv(file_path_toast, encoding='ISO-8859-1')
+
+# Number of tasks that can run at the same time
+MAX_WORKERS = 4
+# Seconds between two checks of the data folder in watch mode
+WATCH_INTERVAL = 2
+
+# Preview mode settings (enabled with --preview):
+# Number of orders/transactions kept from every export
+PREVIEW_BASKETS = 500
+# Number of resamples used for the confidence intervals
+PREVIEW_REPLICATES = 20
+PREVIEW_CONFIDENCE = 0.95
+# A ranking is stable when its top items overlap this much on average with the resamples
+PREVIEW_TOP_K = 10
+PREVIEW_STABLE_OVERLAP = 0.8
+PREVIEW_SEED = 42
+# Basket, date and location columns of every export, the sample keeps whole baskets
+# and spreads them over the dates and locations in proportion to their number of baskets
+PREVIEW_STRATA = {
+    'square_df': ('Transaction ID', 'Date', 'Location'),
+    'toast_df': ('Order Id', 'Order Date', 'Location')
+}
+PREVIEW = False
 
 output_information = {}
+preview_information = {}
 
 
 def set_square_service_times(df, times):
@@ -31,6 +58,38 @@ def set_square_service_times(df, times):
     return df
 
 
+# ======================================
+
+# Loading the exports and keeping only the dine-in sales.
+# Prices are converted from strings like "$1,234.00" to floats right after loading,
+# since every task below works with the numeric values.
+
+def load_square_df():
+    square_df = pd.read_csv(file_path_square)
+    square_df['Gross Sales'] = square_df['Gross Sales'].replace('[\\$,]', '', regex=True).astype(float)
+    if PREVIEW:
+        return sample_baskets('square_df', square_df)
+    return square_df
+
+
+def load_toast_df():
+    toast_df = pd.read_csv(file_path_toast, encoding='ISO-8859-1')
+    toast_df['Net Price'] = toast_df['Net Price'].replace('[\\$,]', '', regex=True).astype(float)
+    if PREVIEW:
+        return sample_baskets('toast_df', toast_df)
+    return toast_df
+
+
+def filter_square_dine_in(square_df):
+    # Filtering Square data for Dine-In sales only
+    return square_df[square_df['Dining Option'] == 'For Here']
+
+
+def filter_toast_dine_in(toast_df):
+    # Filtering Toast data for Dine-In sales only
+    return toast_df[toast_df['Dining Option'] == 'Dine In']
+
+
 # ======================================
 
 # # **Task 2 - Convert Data to Standard Format**
@@ -38,39 +97,40 @@ def set_square_service_times(df, times):
 # to the standard Flapjack format.
 # This format includes the following columns: date, item, price, and order_id.
 
-# Converting Toast POS Data to Standard Format
+def task_2(square_df, toast_df):
+    # Converting Toast POS Data to Standard Format
+    toast_columns_mapping = {
+        'Order Date': 'date',
+        'Menu Item': 'item',
+        'Net Price': 'price',
+        'Order Id': 'order_id'
+    }
+    toast_standard_df = toast_df[toast_columns_mapping.keys()].rename(columns=toast_columns_mapping)
+
+    toast_standard_df['order_id'] = toast_standard_df['order_id'].astype(str)  # Convert order_id to string
+
+    # Converting Square POS Data to Standard Format
+    service_times = {
+        'Breakfast': (time(8, 0), time(12, 0)),
+        'Dinner': (time(12, 0), time(23, 59))
+    }
+    square_df_service_categorized = set_square_service_times(square_df.copy(), service_times)
+
+    # Selecting and renaming the relevant columns for Square data
+    square_columns_mapping = {
+        'Date': 'date',
+        'Item': 'item',
+        'Gross Sales': 'price',
+        'Service': 'order_id'  # Using the 'Service' column as a placeholder for 'order_id'
+    }
+    square_standard_df = square_df_service_categorized[square_columns_mapping.keys()].rename(columns=square_columns_mapping)
+
+    return {
+        'square_df_service_categorized': square_df_service_categorized,
+        'square_standard_df': square_standard_df,
+        'toast_standard_df': toast_standard_df
+    }
 
-toast_df['Net Price'] = toast_df['Net Price'].replace('[\\$,]', '', regex=True).astype(float)
-toast_columns_mapping = {
-    'Order Date': 'date',
-    'Menu Item': 'item',
-    'Net Price': 'price',
-    'Order Id': 'order_id'
-}
-toast_standard_df = toast_df[toast_columns_mapping.keys()].rename(columns=toast_columns_mapping)
-
-toast_standard_df['order_id'] = toast_standard_df['order_id'].astype(str)  # Convert price from string to float and order_id to string
-square_df['Gross Sales'] = square_df['Gross Sales'].replace('[\\$,]', '', regex=True).astype(float)  # Converting Square POS Data to Standard Format
-
-service_times = {
-    'Breakfast': (time(8, 0), time(12, 0)),
-    'Dinner': (time(12, 0), time(23, 59))
-}
-square_df_service_categorized = set_square_service_times(square_df.copy(), service_times)
-
-# Selecting and renaming the relevant columns for Square data
-square_columns_mapping = {
-    'Date': 'date',
-    'Item': 'item',
-    'Gross Sales': 'price',
-    'Service': 'order_id'  # Using the 'Service' column as a placeholder for 'order_id'
-}
-square_standard_df = square_df_service_categorized[square_columns_mapping.keys()].rename(columns=square_columns_mapping)
-
-output_information['task_2'] = {
-    'square_df_service_categorized': square_df_service_categorized,
-    'square_standard_df': square_standard_df
-}
 
 # ======================================
 
@@ -81,117 +141,116 @@ output_information['task_2'] = {
 # Revenue by Service: Determining which service generates the most sales.
 # Revenue Throughout the Week: Analyzing which day of the week records the most sales.
 
+def task_3(task_2_output, toast_df):
+    # Copies, so that the Task 2 frames stay untouched for the other tasks
+    toast_standard_df = task_2_output['toast_standard_df'].copy()
+    square_standard_df = task_2_output['square_standard_df'].copy()
 
-# Converting 'date' columns to datetime for both datasets
-toast_standard_df['date'] = pd.to_datetime(toast_standard_df['date'], format='mixed')
-square_standard_df['date'] = pd.to_datetime(square_standard_df['date'])
+    # Converting 'date' columns to datetime for both datasets
+    toast_standard_df['date'] = pd.to_datetime(toast_standard_df['date'], format='mixed')
+    square_standard_df['date'] = pd.to_datetime(square_standard_df['date'])
 
-# Extracting hour from the datetime for analysis
-toast_standard_df['hour'] = toast_standard_df['date'].dt.hour
-square_standard_df['hour'] = square_standard_df['date'].dt.hour
+    # Extracting hour from the datetime for analysis
+    toast_standard_df['hour'] = toast_standard_df['date'].dt.hour
+    square_standard_df['hour'] = square_standard_df['date'].dt.hour
 
-# Grouping by hour and summing up the sales for Toast data
-toast_sales_by_hour = toast_standard_df.groupby('hour')['price'].sum()
+    # Grouping by hour and summing up the sales for Toast data
+    toast_sales_by_hour = toast_standard_df.groupby('hour')['price'].sum()
 
-# Grouping by hour and summing up the sales for Square data
-square_sales_by_hour = square_standard_df.groupby('hour')['price'].sum()
+    # Grouping by hour and summing up the sales for Square data
+    square_sales_by_hour = square_standard_df.groupby('hour')['price'].sum()
 
-# Grouping Toast data by service and summing up the sales
-toast_sales_by_service = toast_standard_df.groupby(toast_df['Service'])['price'].sum()
+    # Grouping Toast data by service and summing up the sales
+    toast_sales_by_service = toast_standard_df.groupby(toast_df['Service'])['price'].sum()
 
-# Extracting day of the week from the datetime (0=Monday, 6=Sunday)
-toast_standard_df['day_of_week'] = toast_standard_df['date'].dt.dayofweek
-square_standard_df['day_of_week'] = square_standard_df['date'].dt.dayofweek
+    # Extracting day of the week from the datetime (0=Monday, 6=Sunday)
+    toast_standard_df['day_of_week'] = toast_standard_df['date'].dt.dayofweek
+    square_standard_df['day_of_week'] = square_standard_df['date'].dt.dayofweek
 
-# Grouping by day of the week and summing up the sales for Toast data
-toast_sales_by_day_of_week = toast_standard_df.groupby('day_of_week')['price'].sum()
+    # Grouping by day of the week and summing up the sales for Toast data
+    toast_sales_by_day_of_week = toast_standard_df.groupby('day_of_week')['price'].sum()
 
-# Grouping by day of the week and summing up the sales for Square data
-square_sales_by_day_of_week = square_standard_df.groupby('day_of_week')['price'].sum()
+    # Grouping by day of the week and summing up the sales for Square data
+    square_sales_by_day_of_week = square_standard_df.groupby('day_of_week')['price'].sum()
+
+    return {
+        'toast_sales_by_hour': toast_sales_by_hour,
+        'square_sales_by_hour': square_sales_by_hour,
+        'toast_sales_by_service': toast_sales_by_service,
+        'toast_sales_by_day_of_week': toast_sales_by_day_of_week,
+        'square_sales_by_day_of_week': square_sales_by_day_of_week
+    }
 
-output_information['task_3'] = {
-    'toast_sales_by_hour': toast_sales_by_hour,
-    'square_sales_by_hour': square_sales_by_hour,
-    'toast_sales_by_service': toast_sales_by_service,
-    'toast_sales_by_day_of_week': toast_sales_by_day_of_week,
-    'square_sales_by_day_of_week': square_sales_by_day_of_week
-}
 
 # =====================================
 
 # # **Task 4 - Top Selling Categories**
 # In this task, we'll focus on analyzing the top-selling categories by:
-#
 # Ranking Categories by Sales Volume: Identifying which categories generate the most sales.
 # Calculating Average Sale Price per Category: Finding the average price for items in each category.
 # Determining the Percentage of Total Sales per Category:
 # Assessing how much each category contributes to the overall sales.
 # Focusing on Dine-In Sales Data Only: We'll filter out non-dine-in sales.
 
+def task_4(square_dine_in_df, toast_dine_in_df):
+    # Grouping by category for sales volume and average sale price
+    category_sales_volume = square_dine_in_df.groupby('Item')['Gross Sales'].sum().sort_values(ascending=False)
+    category_average_price = square_dine_in_df.groupby('Item')['Gross Sales'].mean()
 
-# Filtering Square data for Dine-In sales only
-square_dine_in_df = square_df[square_df['Dining Option'] == 'For Here']
+    # Calculating the percentage of total sales per category
+    total_sales = square_dine_in_df['Gross Sales'].sum()
+    category_sales_percentage = (category_sales_volume / total_sales) * 100
 
-# Grouping by category for sales volume and average sale price
-category_sales_volume = square_dine_in_df.groupby('Item')['Gross Sales'].sum().sort_values(ascending=False)
-category_average_price = square_dine_in_df.groupby('Item')['Gross Sales'].mean()
-square_dine_in_df.groupby('Item')['Gross Sales'].sum().sort_values(ascending=False).head().plot()
+    category_analysis_square = pd.DataFrame({
+        'Sales Volume': category_sales_volume,
+        'Average Price': category_average_price,
+        'Percentage of Total Sales': category_sales_percentage
+    })
 
-# Calculating the percentage of total sales per category
-total_sales = square_dine_in_df['Gross Sales'].sum()
-category_sales_percentage = (category_sales_volume / total_sales) * 100
+    # Grouping by menu item for sales volume and average sale price
+    menu_item_sales_volume = toast_dine_in_df.groupby('Menu Item')['Net Price'].sum().sort_values(ascending=False)
+    menu_item_average_price = toast_dine_in_df.groupby('Menu Item')['Net Price'].mean()
 
-category_analysis_square = pd.DataFrame({
-    'Sales Volume': category_sales_volume,
-    'Average Price': category_average_price,
-    'Percentage of Total Sales': category_sales_percentage
-})
+    # Calculating the percentage of total sales per menu item
+    total_sales_toast = toast_dine_in_df['Net Price'].sum()
+    menu_item_sales_percentage = (menu_item_sales_volume / total_sales_toast) * 100
 
-# Filtering Toast data for Dine-In sales only
-toast_dine_in_df = toast_df[toast_df['Dining Option'] == 'Dine In']
+    menu_item_analysis_toast = pd.DataFrame({
+        'Sales Volume': menu_item_sales_volume,
+        'Average Price': menu_item_average_price,
+        'Percentage of Total Sales': menu_item_sales_percentage
+    })
 
-# Grouping by menu item for sales volume and average sale price
-menu_item_sales_volume = toast_dine_in_df.groupby('Menu Item')['Net Price'].sum().sort_values(ascending=False)
-menu_item_average_price = toast_dine_in_df.groupby('Menu Item')['Net Price'].mean()
+    return {
+        'category_analysis_square': category_analysis_square,
+        'menu_item_analysis_toast': menu_item_analysis_toast
+    }
 
-# Calculating the percentage of total sales per menu item
-total_sales_toast = toast_dine_in_df['Net Price'].sum()
-menu_item_sales_percentage = (menu_item_sales_volume / total_sales_toast) * 100
-
-menu_item_analysis_toast = pd.DataFrame({
-    'Sales Volume': menu_item_sales_volume,
-    'Average Price': menu_item_average_price,
-    'Percentage of Total Sales': menu_item_sales_percentage
-})
-
-output_information['task_4'] = {
-    'category_analysis_square': category_analysis_square,
-    'menu_item_analysis_toast': menu_item_analysis_toast
-}
 
 # ==================================
 
 # # **Task 5 - Top Selling Categories by Service**
 # In this task, we'll analyze the top-selling categories grouped by service.
 
+def task_5(toast_dine_in_df):
+    # Grouping Toast data by service and menu item for sales volume and average sale price
+    service_category_sales_volume = toast_dine_in_df.groupby(['Service', 'Menu Item'])['Net Price'].sum().sort_values(ascending=False)
+    service_category_average_price = toast_dine_in_df.groupby(['Service', 'Menu Item'])['Net Price'].mean()
 
-# Grouping Toast data by service and menu item for sales volume and average sale price
-service_category_sales_volume = toast_dine_in_df.groupby(['Service', 'Menu Item'])['Net Price'].sum().sort_values(ascending=False)
-service_category_average_price = toast_dine_in_df.groupby(['Service', 'Menu Item'])['Net Price'].mean()
+    # Calculating the percentage of total sales per category within each service
+    service_total_sales = toast_dine_in_df.groupby('Service')['Net Price'].sum()
+    service_category_sales_percentage = service_category_sales_volume.div(service_total_sales, level='Service') * 100
 
-# Calculating the percentage of total sales per category within each service
-service_total_sales = toast_dine_in_df.groupby('Service')['Net Price'].sum()
-service_category_sales_percentage = service_category_sales_volume.div(service_total_sales, level='Service') * 100
+    service_category_analysis_toast = pd.DataFrame({
+        'Sales Volume': service_category_sales_volume,
+        'Average Price': service_category_average_price,
+        'Percentage of Total Sales': service_category_sales_percentage
+    }).reset_index()
 
-service_category_analysis_toast = pd.DataFrame({
-    'Sales Volume': service_category_sales_volume,
-    'Average Price': service_category_average_price,
-    'Percentage of Total Sales': service_category_sales_percentage
-}).reset_index()
+    return {
+        'service_category_analysis_toast': service_category_analysis_toast
+    }
 
-output_information['task_5'] = {
-    'service_category_analysis_toast': service_category_analysis_toast
-}
 
 # ==========================================
 
@@ -203,211 +262,720 @@ output_information['task_5'] = {
 # The Percentage of Total Sales Each Dish Represents.
 # The Percentage of Category Sales Each Dish Represents.
 
-# Filtering for dine-in sales only
-square_dine_in_df = square_df[square_df['Dining Option'] == 'For Here']
+def task_6(square_dine_in_df, toast_dine_in_df):
+    # Grouping by category and item for sales volume
+    dish_sales_volume_square = square_dine_in_df.groupby(['Category', 'Item'])['Gross Sales'].sum().sort_values(ascending=False)
 
-# Grouping by category and item for sales volume
-dish_sales_volume_square = square_dine_in_df.groupby(['Category', 'Item'])['Gross Sales'].sum().sort_values(ascending=False)
+    # Calculating the percentage of total sales and category sales each dish represents
+    total_sales_square = square_dine_in_df['Gross Sales'].sum()
+    category_sales_square = square_dine_in_df.groupby('Category')['Gross Sales'].sum()
+    dish_total_sales_percentage_square = (dish_sales_volume_square / total_sales_square) * 100
+    dish_category_sales_percentage_square = dish_sales_volume_square.div(category_sales_square, level='Category') * 100
 
-# Calculating the percentage of total sales and category sales each dish represents
-total_sales_square = square_dine_in_df['Gross Sales'].sum()
-category_sales_square = square_dine_in_df.groupby('Category')['Gross Sales'].sum()
-dish_total_sales_percentage_square = (dish_sales_volume_square / total_sales_square) * 100
-dish_category_sales_percentage_square = dish_sales_volume_square.div(category_sales_square, level='Category') * 100
+    # Combining the data into a single DataFrame
+    top_dishes_square = pd.DataFrame({
+        'Gross Sales': dish_sales_volume_square,
+        'Percentage of Total Sales': dish_total_sales_percentage_square,
+        'Percentage of Category Sales': dish_category_sales_percentage_square
+    })
 
-# Combining the data into a single DataFrame
-top_dishes_square = pd.DataFrame({
-    'Gross Sales': dish_sales_volume_square,
-    'Percentage of Total Sales': dish_total_sales_percentage_square,
-    'Percentage of Category Sales': dish_category_sales_percentage_square
-})
+    # Grouping by menu item for sales volume (without category) for Toast data
+    dish_sales_volume_toast = toast_dine_in_df.groupby('Menu Item')['Net Price'].sum().sort_values(ascending=False)
 
-# Grouping by menu item for sales volume (without category) for Toast data
-dish_sales_volume_toast = toast_dine_in_df.groupby('Menu Item')['Net Price'].sum().sort_values(ascending=False)
+    # Calculating the percentage of total sales each dish represents
+    total_sales_toast = toast_dine_in_df['Net Price'].sum()
+    dish_total_sales_percentage_toast = (dish_sales_volume_toast / total_sales_toast) * 100
 
-# Calculating the percentage of total sales each dish represents
-dish_total_sales_percentage_toast = (dish_sales_volume_toast / total_sales_toast) * 100
+    # Combining the data into a single DataFrame
+    top_dishes_toast_no_category = pd.DataFrame({
+        'Gross Sales': dish_sales_volume_toast,
+        'Percentage of Total Sales': dish_total_sales_percentage_toast
+    })
 
-# Combining the data into a single DataFrame
-top_dishes_toast_no_category = pd.DataFrame({
-    'Gross Sales': dish_sales_volume_toast,
-    'Percentage of Total Sales': dish_total_sales_percentage_toast
-})
+    return {
+        'top_dishes_square': top_dishes_square,
+        'top_dishes_toast_no_category': top_dishes_toast_no_category
+    }
 
-output_information['task_6'] = {
-    'top_dishes_square': top_dishes_square,
-    'top_dishes_toast_no_category': top_dishes_toast_no_category
-}
 
 # ==========================================
 
 # # **Task 7 - Top Selling Dishes by Service**
 # Next, we'll group data by service and rank top 10 dishes by greatest sales volume, again focusing on dine-in only.
 
-# Grouping Toast data by service and menu item for sales volume
-service_dish_sales_volume_toast = toast_dine_in_df.groupby(['Service', 'Menu Item'])['Net Price'].sum().sort_values(ascending=False)
+def task_7(toast_dine_in_df):
+    # Grouping Toast data by service and menu item for sales volume
+    service_dish_sales_volume_toast = toast_dine_in_df.groupby(['Service', 'Menu Item'])['Net Price'].sum().sort_values(ascending=False)
 
-# Calculating the percentage of total sales and service sales each dish represents
-service_total_sales_toast = toast_dine_in_df.groupby('Service')['Net Price'].sum()
-service_dish_total_sales_percentage_toast = service_dish_sales_volume_toast.div(service_total_sales_toast, level='Service') * 100
+    # Calculating the percentage of total sales and service sales each dish represents
+    service_total_sales_toast = toast_dine_in_df.groupby('Service')['Net Price'].sum()
+    service_dish_total_sales_percentage_toast = service_dish_sales_volume_toast.div(service_total_sales_toast, level='Service') * 100
 
-# Combining the data into a single DataFrame
-top_dishes_by_service_toast = pd.DataFrame({
-    'Gross Sales': service_dish_sales_volume_toast,
-    'Percentage of Total Sales': service_dish_total_sales_percentage_toast
-})
+    # Combining the data into a single DataFrame
+    top_dishes_by_service_toast = pd.DataFrame({
+        'Gross Sales': service_dish_sales_volume_toast,
+        'Percentage of Total Sales': service_dish_total_sales_percentage_toast
+    })
+
+    return {
+        'top_dishes_by_service_toast': top_dishes_by_service_toast
+    }
 
-output_information['task_7'] = {
-    'top_dishes_by_service_toast': top_dishes_by_service_toast
-}
 
 # ==========================================
 
 # # **Task 8 - Items Commonly Sold Together**
 # This task involves identifying the top 20 pairs of items that are most commonly sold together.
 
-# Grouping items by Transaction ID to find combinations
-grouped_items = square_dine_in_df.groupby('Transaction ID')['Item'].apply(list)
-
-# Generate all item pairs within each transaction, excluding duplicates and self-pairs
-item_pairs = Counter()
-for items in grouped_items:
-    for item_pair in combinations(set(items), 2):
-        # Sorting the pair to treat different orderings as the same (e.g., A-B and B-A)
-        item_pairs[tuple(sorted(item_pair))] += 1
-
-# Get the top 20 most common pairs
-top_20_pairs = item_pairs.most_common(20)
-
-# Convert to DataFrame for further analysis
-top_20_pairs_df = pd.DataFrame(top_20_pairs, columns=['Item Pair', 'Frequency'])
-
-# Calculate additional metrics
-top_20_pairs_df['Probability of Pair Sold Together'] = top_20_pairs_df['Frequency'] / len(grouped_items)
-top_20_pairs_df['Total Sales Volume'] = top_20_pairs_df['Item Pair'].apply(
-    lambda x: square_dine_in_df[
-        square_dine_in_df['Item'].isin(x)
-    ]['Gross Sales'].sum()
-)
-
-# Filter out non-dine-in sales
-toast_dine_in_df = toast_df[toast_df['Dining Option'] == 'Dine In']
-
-# Grouping items by Order Id to find combinations
-grouped_items_toast = toast_dine_in_df.groupby('Order Id')['Menu Item'].apply(list)
-
-# Generate all item pairs within each order, excluding duplicates and self-pairs
-item_pairs_toast = Counter()
-for items in grouped_items_toast:
-    for item_pair in combinations(set(items), 2):
-        # Sorting the pair to treat different orderings as the same
-        item_pairs_toast[tuple(sorted(item_pair))] += 1
-
-# Get the top 20 most common pairs for Toast data
-top_20_pairs_toast = item_pairs_toast.most_common(20)
-
-# Convert to DataFrame for further analysis
-top_20_pairs_toast_df = pd.DataFrame(top_20_pairs_toast, columns=['Item Pair', 'Frequency'])
-
-# Calculate additional metrics for Toast data
-top_20_pairs_toast_df['Probability of Pair Sold Together'] = top_20_pairs_toast_df['Frequency'] / len(grouped_items_toast)
-top_20_pairs_toast_df['Total Sales Volume'] = top_20_pairs_toast_df['Item Pair'].apply(
-    lambda x: toast_dine_in_df[
-        toast_dine_in_df['Menu Item'].isin(x)
-    ]['Net Price'].sum()
-)
-
-output_information['task_8'] = {
-    'top_20_pairs_df': top_20_pairs_df,
-    'top_20_pairs_toast_df': top_20_pairs_toast_df
-}
+def task_8(square_dine_in_df, toast_dine_in_df):
+    # Grouping items by Transaction ID to find combinations
+    grouped_items = square_dine_in_df.groupby('Transaction ID')['Item'].apply(list)
+
+    # Generate all item pairs within each transaction, excluding duplicates and self-pairs
+    item_pairs = Counter()
+    for items in grouped_items:
+        for item_pair in combinations(set(items), 2):
+            # Sorting the pair to treat different orderings as the same (e.g., A-B and B-A)
+            item_pairs[tuple(sorted(item_pair))] += 1
+
+    # Get the top 20 most common pairs
+    top_20_pairs = item_pairs.most_common(20)
+
+    # Convert to DataFrame for further analysis
+    top_20_pairs_df = pd.DataFrame(top_20_pairs, columns=['Item Pair', 'Frequency'])
+
+    # Calculate additional metrics
+    top_20_pairs_df['Probability of Pair Sold Together'] = top_20_pairs_df['Frequency'] / len(grouped_items)
+    top_20_pairs_df['Total Sales Volume'] = top_20_pairs_df['Item Pair'].apply(
+        lambda x: square_dine_in_df[
+            square_dine_in_df['Item'].isin(x)
+        ]['Gross Sales'].sum()
+    )
+
+    # Grouping items by Order Id to find combinations
+    grouped_items_toast = toast_dine_in_df.groupby('Order Id')['Menu Item'].apply(list)
+
+    # Generate all item pairs within each order, excluding duplicates and self-pairs
+    item_pairs_toast = Counter()
+    for items in grouped_items_toast:
+        for item_pair in combinations(set(items), 2):
+            # Sorting the pair to treat different orderings as the same
+            item_pairs_toast[tuple(sorted(item_pair))] += 1
+
+    # Get the top 20 most common pairs for Toast data
+    top_20_pairs_toast = item_pairs_toast.most_common(20)
+
+    # Convert to DataFrame for further analysis
+    top_20_pairs_toast_df = pd.DataFrame(top_20_pairs_toast, columns=['Item Pair', 'Frequency'])
+
+    # Calculate additional metrics for Toast data
+    top_20_pairs_toast_df['Probability of Pair Sold Together'] = top_20_pairs_toast_df['Frequency'] / len(grouped_items_toast)
+    top_20_pairs_toast_df['Total Sales Volume'] = top_20_pairs_toast_df['Item Pair'].apply(
+        lambda x: toast_dine_in_df[
+            toast_dine_in_df['Menu Item'].isin(x)
+        ]['Net Price'].sum()
+    )
+
+    return {
+        'top_20_pairs_df': top_20_pairs_df,
+        'top_20_pairs_toast_df': top_20_pairs_toast_df
+    }
+
 
 # ==========================================
 
 # # **Task 9 - Categories Commonly Sold Together**
 # This task involves identifying categories that are commonly sold together.
 
+def task_9(square_dine_in_df, toast_dine_in_df):
+    # Grouping items by Transaction ID to find category combinations
+    grouped_categories = square_dine_in_df.groupby('Transaction ID')['Category'].apply(list)
+
+    # Generate all category pairs within each transaction, excluding duplicates and self-pairs
+    category_pairs = Counter()
+    for categories in grouped_categories:
+        for category_pair in combinations(set(categories), 2):
+            # Sorting the pair to treat different orderings as the same
+            category_pair = {str(category_pair[0]), str(category_pair[1])}
+            category_pairs[tuple(sorted(category_pair))] += 1
+
+    # Get the top 20 most common category pairs
+    top_category_pairs = category_pairs.most_common(20)
+
+    # Convert to DataFrame for further analysis
+    top_category_pairs_df = pd.DataFrame(top_category_pairs, columns=['Category Pair', 'Frequency'])
+
+    # Calculate additional metrics
+    top_category_pairs_df['Probability of Category Pair Sold Together'] = top_category_pairs_df['Frequency'] / len(grouped_categories)
+    top_category_pairs_df['Total Sales Volume'] = top_category_pairs_df['Category Pair'].apply(
+        lambda x: square_dine_in_df[
+            square_dine_in_df['Category'].isin(x)
+        ]['Gross Sales'].sum()
+    )
+
+    # Handling null or problematic values in 'Menu Group'
+    # (on a copy, since the dine-in frame is shared with the other tasks)
+    toast_dine_in_df = toast_dine_in_df.assign(**{'Menu Group': toast_dine_in_df['Menu Group'].fillna('Unknown').astype(str)})
+    grouped_menu_groups = toast_dine_in_df.groupby('Order Id')['Menu Group'].apply(list)
+
+    # Regenerate Menu Group pairs with the corrected data
+    menu_group_pairs_corrected = Counter()
+    for menu_groups in grouped_menu_groups:
+        # Ensure all menu groups are strings and filter out any 'Unknown' or empty groups
+        cleaned_menu_groups = [str(group) for group in menu_groups if group and group != 'Unknown']
+        for menu_group_pair in combinations(set(cleaned_menu_groups), 2):
+            menu_group_pairs_corrected[tuple(sorted(menu_group_pair))] += 1
+
+    # Get the top 20 most common Menu Group pairs with corrected data
+    top_menu_group_pairs_corrected = menu_group_pairs_corrected.most_common(20)
+
+    # Convert to DataFrame for further analysis
+    top_menu_group_pairs_corrected_df = pd.DataFrame(top_menu_group_pairs_corrected, columns=['Menu Group Pair', 'Frequency'])
+
+    # Calculate additional metrics for corrected data
+    top_menu_group_pairs_corrected_df['Probability of Menu Group Pair Sold Together'] = top_menu_group_pairs_corrected_df['Frequency'] / len(grouped_menu_groups)
+    top_menu_group_pairs_corrected_df['Total Sales Volume'] = top_menu_group_pairs_corrected_df['Menu Group Pair'].apply(
+        lambda x: toast_dine_in_df[
+            toast_dine_in_df['Menu Group'].isin(x)
+        ]['Net Price'].sum()
+    )
+
+    return {
+        'top_category_pairs_df': top_category_pairs_df,
+        'top_menu_group_pairs_corrected_df': top_menu_group_pairs_corrected_df
+    }
+
 
-# Grouping items by Transaction ID to find category combinations
-grouped_categories = square_dine_in_df.groupby('Transaction ID')['Category'].apply(list)
-
-# Generate all category pairs within each transaction, excluding duplicates and self-pairs
-category_pairs = Counter()
-for categories in grouped_categories:
-    for category_pair in combinations(set(categories), 2):
-        # Sorting the pair to treat different orderings as the same
-        category_pair = {str(category_pair[0]), str(category_pair[1])}
-        category_pairs[tuple(sorted(category_pair))] += 1
-
-# Get the top 20 most common category pairs
-top_category_pairs = category_pairs.most_common(20)
-
-# Convert to DataFrame for further analysis
-top_category_pairs_df = pd.DataFrame(top_category_pairs, columns=['Category Pair', 'Frequency'])
-
-# Calculate additional metrics
-top_category_pairs_df['Probability of Category Pair Sold Together'] = top_category_pairs_df['Frequency'] / len(grouped_categories)
-top_category_pairs_df['Total Sales Volume'] = top_category_pairs_df['Category Pair'].apply(
-    lambda x: square_dine_in_df[
-        square_dine_in_df['Category'].isin(x)
-    ]['Gross Sales'].sum()
-)
-
-# Handling null or problematic values in 'Menu Group'
-toast_dine_in_df.loc[:, 'Menu Group'] = toast_dine_in_df['Menu Group'].fillna('Unknown').astype(str)
-grouped_menu_groups = toast_dine_in_df.groupby('Order Id')['Menu Group'].apply(list)
-
-# Regenerate Menu Group pairs with the corrected data
-menu_group_pairs_corrected = Counter()
-for menu_groups in grouped_menu_groups:
-    # Ensure all menu groups are strings and filter out any 'Unknown' or empty groups
-    cleaned_menu_groups = [str(group) for group in menu_groups if group and group != 'Unknown']
-    for menu_group_pair in combinations(set(cleaned_menu_groups), 2):
-        menu_group_pairs_corrected[tuple(sorted(menu_group_pair))] += 1
-
-# Get the top 20 most common Menu Group pairs with corrected data
-top_menu_group_pairs_corrected = menu_group_pairs_corrected.most_common(20)
-
-# Convert to DataFrame for further analysis
-top_menu_group_pairs_corrected_df = pd.DataFrame(top_menu_group_pairs_corrected, columns=['Menu Group Pair', 'Frequency'])
-
-# Calculate additional metrics for corrected data
-top_menu_group_pairs_corrected_df['Probability of Menu Group Pair Sold Together'] = top_menu_group_pairs_corrected_df['Frequency'] / len(grouped_menu_groups)
-top_menu_group_pairs_corrected_df['Total Sales Volume'] = top_menu_group_pairs_corrected_df['Menu Group Pair'].apply(
-    lambda x: toast_dine_in_df[
-        toast_dine_in_df['Menu Group'].isin(x)
-    ]['Net Price'].sum()
-)
-
-output_information['task_9'] = {
-    'top_category_pairs_df': top_category_pairs_df,
-    'top_menu_group_pairs_corrected_df': top_menu_group_pairs_corrected_df
+# ==========================================
+
+# # **Task 10 - Sales Trends per Item**
+# This task follows the sales of every item over time, using the standard format from Task 2:
+#
+# A dense date x item matrix of the daily sales.
+# Rolling sales (sum and daily average) over the last week, and their change from the week before.
+# The items whose sales grew or dropped the most over the last week.
+#
+# Everything is computed on the whole matrix at once instead of grouping by item.
+# In watch mode, only the days from the last known one on are added to the previous matrix.
+
+# Length of the rolling window in days, one week
+TREND_WINDOW = 7
+
+
+def build_daily_item_sales(days, standard_df):
+    # Sums the sales of every (day, item) cell with a single bincount
+    item_codes, items = pd.factorize(standard_df['item'])
+    dates = pd.date_range(days.min(), days.max(), freq='D')
+    day_codes = (days - days.min()).dt.days.to_numpy()
+    sales = np.bincount(
+        day_codes * len(items) + item_codes,
+        weights=standard_df['price'].to_numpy(),
+        minlength=len(dates) * len(items)
+    )
+    return pd.DataFrame(sales.reshape(len(dates), len(items)), index=dates, columns=items)
+
+
+def get_rolling_sales(daily_sales):
+    # Rolling sums as differences of the cumulative sums, for all items at once
+    cumulative_sales = np.vstack([np.zeros((1, daily_sales.shape[1])), daily_sales.to_numpy().cumsum(axis=0)])
+    window_starts = np.maximum(np.arange(1, len(daily_sales) + 1) - TREND_WINDOW, 0)
+    rolling_sales = cumulative_sales[1:] - cumulative_sales[window_starts]
+    return pd.DataFrame(rolling_sales, index=daily_sales.index, columns=daily_sales.columns)
+
+
+def get_item_trends(standard_df, previous_daily_sales=None, previous_rolling_sales=None):
+    standard_df = standard_df.dropna(subset=['item', 'price'])
+    days = pd.to_datetime(standard_df['date'], format='mixed').dt.normalize()
+
+    # The previous matrix is only extended when the export still starts on the same day and goes at least as far
+    if (
+        previous_daily_sales is None
+        or days.min() != previous_daily_sales.index[0]
+        or days.max() < previous_daily_sales.index[-1]
+    ):
+        daily_sales = build_daily_item_sales(days, standard_df)
+        rolling_sales = get_rolling_sales(daily_sales)
+    else:
+        # The last known day is built again, since it could have been incomplete
+        last_day = previous_daily_sales.index[-1]
+        new_rows = days >= last_day
+        new_daily_sales = build_daily_item_sales(days[new_rows], standard_df[new_rows])
+        daily_sales = pd.concat([previous_daily_sales.iloc[:-1], new_daily_sales]).fillna(0)
+
+        # The rolling sums of the new days only need the window of days before them
+        window_start = max(len(previous_daily_sales) - TREND_WINDOW, 0)
+        new_rolling_sales = get_rolling_sales(daily_sales.iloc[window_start:]).loc[last_day:]
+        rolling_sales = pd.concat([previous_rolling_sales.iloc[:-1], new_rolling_sales]).fillna(0)
+        rolling_sales = rolling_sales[daily_sales.columns]
+
+    # Days at the start of the export have less than a full window
+    days_in_window = np.minimum(np.arange(1, len(rolling_sales) + 1), TREND_WINDOW)
+    rolling_mean_sales = rolling_sales.div(days_in_window, axis=0)
+    previous_week_sales = rolling_sales.shift(TREND_WINDOW)
+    week_over_week = rolling_sales - previous_week_sales
+
+    item_trends = pd.DataFrame({
+        'Last Week Sales': rolling_sales.iloc[-1],
+        'Previous Week Sales': previous_week_sales.iloc[-1].fillna(0),
+    })
+    item_trends['Week over Week Change'] = item_trends['Last Week Sales'] - item_trends['Previous Week Sales']
+    item_trends = item_trends.sort_values('Week over Week Change', ascending=False)
+
+    return {
+        'daily_sales': daily_sales,
+        'rolling_sales': rolling_sales,
+        'rolling_mean_sales': rolling_mean_sales,
+        'week_over_week': week_over_week,
+        'item_trends': item_trends
+    }
+
+
+def task_10(task_2_output):
+    # In watch mode, the output of the previous run is extended instead of being built again.
+    # Not in preview mode, where every run works on a new sample with its own sampling factor.
+    previous = {} if PREVIEW else node_results.get('task_10', {})
+    output = {}
+    for source in ['toast', 'square']:
+        item_trends = get_item_trends(
+            task_2_output[f'{source}_standard_df'],
+            previous.get(f'{source}_daily_sales'),
+            previous.get(f'{source}_rolling_sales')
+        )
+        output.update({f'{source}_{key}': value for key, value in item_trends.items()})
+    return output
+
+
+# ==========================================
+
+# # **Preview Mode**
+# Runs Tasks 3-10 on a stratified sample of the orders, so the report is ready in about the same time
+# whatever the size of the history.
+# Whole baskets (Transaction ID / Order Id) are sampled, stratified by date and location.
+# Sums and frequencies are scaled back up to the full history, and every numeric result of Tasks 3-9
+# and of the Task 10 item trends gets a confidence interval from resampling the sampled baskets.
+# Rankings whose top items change between the resamples are flagged on the charts.
+
+# Columns holding sums or counts, scaled back up by the sampling factor.
+# Averages, percentages and probabilities are ratios and are left as they are.
+PREVIEW_SCALED_COLUMNS = [
+    'Sales Volume',
+    'Gross Sales',
+    'Total Sales Volume',
+    'Frequency',
+    'Last Week Sales',
+    'Previous Week Sales',
+    'Week over Week Change'
+]
+
+# Tasks that get confidence intervals and ranking checks
+PREVIEW_TASKS = ['task_3', 'task_4', 'task_5', 'task_6', 'task_7', 'task_8', 'task_9', 'task_10']
+
+# Task 10 matrices, only holding sales sums, averages and their differences.
+# They are scaled as a whole, without intervals.
+PREVIEW_SCALED_OUTPUTS = [
+    f'{source}_{key}'
+    for source in ['toast', 'square']
+    for key in ['daily_sales', 'rolling_sales', 'rolling_mean_sales', 'week_over_week']
+]
+
+# Columns identifying the rows of the outputs that are not indexed by their key
+PREVIEW_KEY_COLUMNS = {
+    'service_category_analysis_toast': ['Service', 'Menu Item'],
+    'top_20_pairs_df': ['Item Pair'],
+    'top_20_pairs_toast_df': ['Item Pair'],
+    'top_category_pairs_df': ['Category Pair'],
+    'top_menu_group_pairs_corrected_df': ['Menu Group Pair']
 }
 
+# Export every output is computed from, its sums and counts are scaled with the sampling factor of that export
+PREVIEW_OUTPUT_SOURCES = {
+    'toast_sales_by_hour': 'toast_df',
+    'square_sales_by_hour': 'square_df',
+    'toast_sales_by_service': 'toast_df',
+    'toast_sales_by_day_of_week': 'toast_df',
+    'square_sales_by_day_of_week': 'square_df',
+    'category_analysis_square': 'square_df',
+    'menu_item_analysis_toast': 'toast_df',
+    'service_category_analysis_toast': 'toast_df',
+    'top_dishes_square': 'square_df',
+    'top_dishes_toast_no_category': 'toast_df',
+    'top_dishes_by_service_toast': 'toast_df',
+    'top_20_pairs_df': 'square_df',
+    'top_20_pairs_toast_df': 'toast_df',
+    'top_category_pairs_df': 'square_df',
+    'top_menu_group_pairs_corrected_df': 'toast_df',
+    **{
+        f'{source}_{key}': f'{source}_df'
+        for source in ['toast', 'square']
+        for key in ['daily_sales', 'rolling_sales', 'rolling_mean_sales', 'week_over_week', 'item_trends']
+    }
+}
+
+# Pair outputs with their dine-in frame, basket, item, price and probability columns.
+# Every resample counts the pairs of the estimate, its own top 20 pairs would only hold
+# the pairs that happened to rank high in it.
+PREVIEW_PAIR_OUTPUTS = {
+    'top_20_pairs_df': ('square_dine_in_df', 'Transaction ID', 'Item', 'Gross Sales', 'Probability of Pair Sold Together'),
+    'top_20_pairs_toast_df': ('toast_dine_in_df', 'Order Id', 'Menu Item', 'Net Price', 'Probability of Pair Sold Together'),
+    'top_category_pairs_df': ('square_dine_in_df', 'Transaction ID', 'Category', 'Gross Sales', 'Probability of Category Pair Sold Together'),
+    'top_menu_group_pairs_corrected_df': ('toast_dine_in_df', 'Order Id', 'Menu Group', 'Net Price', 'Probability of Menu Group Pair Sold Together')
+}
+
+# Outputs charted by hour, service or day of the week, they are not rankings
+PREVIEW_UNRANKED_OUTPUTS = [
+    'toast_sales_by_hour',
+    'square_sales_by_hour',
+    'toast_sales_by_service',
+    'toast_sales_by_day_of_week',
+    'square_sales_by_day_of_week'
+]
+
+# Outputs also charted from the bottom (declining items), with the columns ranked that way
+PREVIEW_BOTTOM_RANKINGS = {
+    'toast_item_trends': ['Week over Week Change'],
+    'square_item_trends': ['Week over Week Change']
+}
+
+# Outputs charted per service, their ranking is checked within every service
+PREVIEW_RANKING_GROUPS = {
+    'service_category_analysis_toast': 'Service',
+    'top_dishes_by_service_toast': 'Service'
+}
+
+
+def get_basket_strata(df, source):
+    # One row per basket with the date and location of its first item
+    basket_column, date_column, location_column = PREVIEW_STRATA[source]
+    baskets = df.groupby(basket_column).agg(date=(date_column, 'first'), location=(location_column, 'first'))
+    baskets['date'] = pd.to_datetime(baskets['date'], format='mixed').dt.date
+    return baskets
+
+
+def sample_baskets(source, df):
+    basket_column = PREVIEW_STRATA[source][0]
+    baskets = get_basket_strata(df, source)
+
+    # Every date/location gets `fraction` of its baskets. The fractional part of that share is
+    # drawn at random, so a small stratum keeps 0 or 1 basket and the sample stays close to
+    # PREVIEW_BASKETS however many dates and locations there are
+    fraction = min(1.0, PREVIEW_BASKETS / len(baskets))
+    random_generator = np.random.default_rng(PREVIEW_SEED)
+    strata_sizes = baskets.groupby(['date', 'location'])['date'].transform('size').to_numpy()
+    shares = strata_sizes * fraction
+    sample_sizes = np.floor(shares) + (random_generator.random(len(baskets)) < shares - np.floor(shares))
+    # The sample size of a stratum has to be the same for all of its baskets
+    sample_sizes = pd.Series(sample_sizes, index=baskets.index).groupby([baskets['date'], baskets['location']]).transform('first')
+
+    # Random order within every stratum, then the first baskets up to its sample size
+    baskets['order'] = random_generator.random(len(baskets))
+    ranks = baskets.groupby(['date', 'location'])['order'].rank(method='first') - 1
+    sampled_baskets = baskets[ranks < sample_sizes]
+    if sampled_baskets.empty:
+        raise ValueError(f"The preview sample of {source} is empty, increase PREVIEW_BASKETS")
+
+    # Every basket is kept with probability `fraction`, so its weight (Horvitz-Thompson) is 1 / fraction
+    preview_information[source] = {
+        'baskets': len(baskets),
+        'sampled_baskets': len(sampled_baskets),
+        'scale': 1 / fraction
+    }
+    return df[df[basket_column].isin(sampled_baskets.index)].reset_index(drop=True)
+
+
+def resample_baskets(source, df, random_state):
+    # Draws the sampled baskets again with replacement (bootstrap).
+    # Most strata only hold one or two sampled baskets, resampling within them would hide most
+    # of the variance, so all the sampled baskets are resampled together (slightly wider intervals).
+    basket_column = PREVIEW_STRATA[source][0]
+    baskets = df[basket_column].drop_duplicates()
+    drawn = baskets.sample(frac=1, replace=True, random_state=random_state).to_numpy()
+
+    # A basket drawn more than once gets a new id for every copy, so the copies stay separate baskets
+    copies = pd.DataFrame({basket_column: drawn})
+    copies['copy'] = copies.groupby(basket_column).cumcount()
+    resampled = copies.merge(df, on=basket_column)
+    resampled[basket_column] = resampled[basket_column].astype(str) + '-' + resampled['copy'].astype(str)
+    return resampled.drop(columns='copy')
+
+
+def run_preview_tasks(square_df, toast_df):
+    # Runs the dine-in filters, Task 2 and the preview tasks one after another on the given exports
+    results = {'square_df': square_df, 'toast_df': toast_df}
+    for name, (function, inputs) in TASK_GRAPH.items():
+        if name.endswith('_dine_in_df') or name == 'task_2' or name in PREVIEW_TASKS:
+            results[name] = function(*[results[node] for node in inputs])
+    return results
+
+
+def get_preview_values(output, key):
+    # Output as a frame indexed by its key, with the sums and counts scaled back up
+    if isinstance(output, pd.Series):
+        values = output.to_frame('value')
+    elif key in PREVIEW_KEY_COLUMNS:
+        values = output.set_index(PREVIEW_KEY_COLUMNS[key])
+    else:
+        values = output
+    values = values.select_dtypes('number').copy()
+
+    scale = preview_information[PREVIEW_OUTPUT_SOURCES[key]]['scale']
+    scaled_columns = values.columns if isinstance(output, pd.Series) else values.columns.intersection(PREVIEW_SCALED_COLUMNS)
+    values[scaled_columns] = values[scaled_columns] * scale
+    return values
+
+
+def count_preview_pairs(output, key, results):
+    # The pairs of the estimate, counted in the baskets of a resample
+    dine_in_node, basket_column, item_column, price_column, probability_column = PREVIEW_PAIR_OUTPUTS[key]
+    dine_in_df = results[dine_in_node]
+    pair_column = PREVIEW_KEY_COLUMNS[key][0]
+
+    # str() on every value like the tasks do, a missing category becomes 'nan'
+    baskets_by_item = dine_in_df.groupby(dine_in_df[item_column].map(str))[basket_column].agg(set)
+    pairs = output[pair_column]
+    pair_counts = pd.DataFrame({
+        pair_column: pairs,
+        'Frequency': [len(baskets_by_item.get(first, set()) & baskets_by_item.get(second, set())) for first, second in pairs]
+    })
+    pair_counts[probability_column] = pair_counts['Frequency'] / dine_in_df[basket_column].nunique()
+    pair_counts['Total Sales Volume'] = [dine_in_df[dine_in_df[item_column].isin(pair)][price_column].sum() for pair in pairs]
+    return pair_counts
+
+
+def get_top_positions(values, column, bottom=False):
+    ranked = values[column].reset_index(drop=True)
+    return set(ranked.nsmallest(PREVIEW_TOP_K).index if bottom else ranked.nlargest(PREVIEW_TOP_K).index)
+
+
+def check_preview_output(key, output, replicate_outputs):
+    # Returns the scaled output with its intervals, and the rankings that are not stable
+    values = get_preview_values(output, key)
+
+    # A row missing from a resample sold nothing in it, only its averages do not exist there
+    replicates = []
+    for replicate_output in replicate_outputs:
+        replicate = get_preview_values(replicate_output, key).reindex(values.index)
+        replicates.append(replicate.fillna({column: 0 for column in replicate.columns if column != 'Average Price'}))
+
+    replicate_values = np.stack([replicate.to_numpy(dtype=float) for replicate in replicates])
+    lower, upper = (1 - PREVIEW_CONFIDENCE) / 2, (1 + PREVIEW_CONFIDENCE) / 2
+    intervals = pd.concat({
+        'Estimate': values,
+        'CI Low': pd.DataFrame(np.nanquantile(replicate_values, lower, axis=0), index=values.index, columns=values.columns),
+        'CI High': pd.DataFrame(np.nanquantile(replicate_values, upper, axis=0), index=values.index, columns=values.columns)
+    }, axis=1)
+
+    # Rankings whose top items are not the same from one resample to the next,
+    # checked within every service for the outputs charted per service.
+    # The top rows of an unstable ranking are kept, so that the charts showing them get flagged.
+    unstable_rows = {}
+    unstable_rankings = []
+    if key not in PREVIEW_UNRANKED_OUTPUTS:
+        group_level = PREVIEW_RANKING_GROUPS.get(key)
+        groups = values.groupby(level=group_level).indices if group_level else {None: np.arange(len(values))}
+        rankings = [(column, False) for column in values.columns]
+        rankings += [(column, True) for column in PREVIEW_BOTTOM_RANKINGS.get(key, [])]
+        for column, bottom in rankings:
+            for group, positions in groups.items():
+                top_positions = get_top_positions(values.iloc[positions], column, bottom)
+                if not top_positions:
+                    continue
+                overlap = np.mean([
+                    len(top_positions.intersection(get_top_positions(replicate.iloc[positions], column, bottom))) / len(top_positions)
+                    for replicate in replicates
+                ])
+                if overlap < PREVIEW_STABLE_OVERLAP:
+                    rows = output.index[positions[sorted(top_positions)]]
+                    unstable_rows.setdefault(None if isinstance(output, pd.Series) else column, set()).update(rows)
+                    unstable_rankings.append((key, f'{column} (bottom)' if bottom else column, group, overlap))
+
+    # Charts use the scaled values. The unstable rows (for the chart titles) and the intervals
+    # (for the error bars) are kept with the output, the intervals indexed like its rows
+    scaled = output.copy()
+    if isinstance(output, pd.Series):
+        scaled[:] = values['value'].to_numpy()
+    else:
+        scaled[values.columns] = values.to_numpy()
+    scaled.attrs['unstable_rankings'] = unstable_rows
+    scaled.attrs['confidence_intervals'] = intervals.set_axis(output.index)
+    return scaled, intervals, unstable_rankings
+
+
+def preview_results(square_df, toast_df, *task_outputs):
+    if not PREVIEW:
+        return None
+
+    replicate_results = [
+        run_preview_tasks(
+            resample_baskets('square_df', square_df, PREVIEW_SEED + replicate),
+            resample_baskets('toast_df', toast_df, PREVIEW_SEED + replicate)
+        )
+        for replicate in range(1, PREVIEW_REPLICATES + 1)
+    ]
+
+    # The outputs are always scaled from node_results, output_information can already hold scaled outputs in watch mode
+    intervals = {}
+    unstable_rankings = []
+    for task in PREVIEW_TASKS:
+        intervals[task] = {}
+        for key, output in node_results[task].items():
+            if key in PREVIEW_SCALED_OUTPUTS:
+                output_information[task][key] = output * preview_information[PREVIEW_OUTPUT_SOURCES[key]]['scale']
+                continue
+            if key in PREVIEW_PAIR_OUTPUTS:
+                replicate_outputs = [count_preview_pairs(output, key, result) for result in replicate_results]
+            else:
+                replicate_outputs = [result[task][key] for result in replicate_results]
+            output_information[task][key], intervals[task][key], output_unstable_rankings = check_preview_output(key, output, replicate_outputs)
+            unstable_rankings += [(task, *ranking) for ranking in output_unstable_rankings]
+
+    for source in PREVIEW_STRATA:
+        sample = preview_information[source]
+        print(f"Preview of {source}: {sample['sampled_baskets']} of {sample['baskets']} baskets, totals scaled by {sample['scale']:.2f}")
+    for task, key, column, group, overlap in unstable_rankings:
+        ranking = f"{key} '{column}'" + (f" in {group}" if group is not None else '')
+        print(f"Unstable ranking: {task} {ranking} (top {PREVIEW_TOP_K} overlap {overlap:.0%})")
+
+    preview_information['intervals'] = intervals
+    preview_information['unstable_rankings'] = unstable_rankings
+    return intervals
+
 
 # ==========================================
 
 # Export everything to a PDF file
 
-def add_chart_plot(df, title, kind, x, y, show_legend=False, bottom_adjustment: float | None = 0.5, left_adjustment=None):
-    df.plot(
-        title=title,
-        kind=kind,
-        x=x,
-        y=y,
-        legend=show_legend
-    )
-    plt.subplots_adjust(bottom=bottom_adjustment, left=left_adjustment)
-    pdf.savefig()
-    plt.close()
+# Report layout settings:
+# - 'grid' packs every group of related charts onto a single page
+# - 'single' keeps the previous one chart per page layout
+REPORT_LAYOUT = 'grid'
+# Output file of the report
+REPORT_PATH = 'pdfoutput.pdf'
+# Resolution used for the rasterized parts of the pages
+REPORT_DPI = 150
+# Rasterize the bars so that bar heavy pages do not store every bar as a vector shape
+RASTERIZE_BARS = False
+# Renders the 'single' layout as well and prints the time and size of both files (--compare-layouts)
+COMPARE_LAYOUTS = False
+# A4 portrait, in inches
+PAGE_SIZE = (8.27, 11.69)
+
+# Sets the grid for the plots to be max size
+GRID_ROWS, GRID_COLUMNS = 29, 21
+gs = gridspec.GridSpec(GRID_ROWS, GRID_COLUMNS, wspace=0.1, hspace=0.1, top=0.97, bottom=0.03)
+# Sets the font size for the plots
+plt.rcParams.update({'font.size': 8})
+
+# Every page is a list of charts, every chart is a dictionary of add_chart_plot arguments
+report_pages = []
 
 
-with PdfPages('pdfoutput.pdf') as pdf:
-    # Sets the grid for the plots to be max size
-    gs = gridspec.GridSpec(29, 21, wspace=0.1, hspace=0.1)
-    # Sets the font size for the plots
-    plt.rcParams.update({'font.size': 8})
+def start_chart_page():
+    report_pages.append([])
 
+
+def add_chart_plot(df, title, kind, x, y, show_legend=False, bottom_adjustment: float | None = 0.5, left_adjustment=None):
+    # Preview mode flags the charts showing the top rows of an unstable ranking
+    unstable_rows = df.attrs.get('unstable_rankings', {}).get(y)
+    if unstable_rows and df.index.isin(list(unstable_rows)).any():
+        title = f"{title} (unstable)"
+
+    # Preview confidence intervals, drawn as a line from the low to the high end over every bar
+    intervals = None
+    if 'confidence_intervals' in df.attrs and kind in ('bar', 'barh'):
+        column = 'value' if isinstance(df, pd.Series) else y
+        chart_intervals = df.attrs['confidence_intervals'].reindex(df.index)
+        intervals = (chart_intervals[('CI Low', column)].to_numpy(), chart_intervals[('CI High', column)].to_numpy())
+
+    report_pages[-1].append({
+        'df': df,
+        'title': title,
+        'kind': kind,
+        'x': x,
+        'y': y,
+        'show_legend': show_legend,
+        'bottom_adjustment': bottom_adjustment,
+        'left_adjustment': left_adjustment,
+        'intervals': intervals
+    })
+
+
+def draw_chart(ax, chart):
+    chart['df'].plot(
+        title=chart['title'],
+        kind=chart['kind'],
+        x=chart['x'],
+        y=chart['y'],
+        legend=chart['show_legend'],
+        ax=ax
+    )
+    if chart['intervals'] is not None:
+        # The bars are at positions 0, 1, 2...
+        low, high = chart['intervals']
+        positions = np.arange(len(low))
+        if chart['kind'] == 'barh':
+            ax.hlines(positions, low, high, color='black', linewidth=0.8)
+        else:
+            ax.vlines(positions, low, high, color='black', linewidth=0.8)
+    if RASTERIZE_BARS:
+        # Bars are drawn at zorder 1, the axis, labels and titles stay as vectors
+        ax.set_rasterization_zorder(1.5)
+
+
+def render_single_page(pdf, chart):
+    fig, ax = plt.subplots()
+    draw_chart(ax, chart)
+    fig.subplots_adjust(bottom=chart['bottom_adjustment'], left=chart['left_adjustment'])
+    pdf.savefig(fig, dpi=REPORT_DPI)
+    plt.close(fig)
+
+
+def render_grid_page(pdf, fig, page_axes, charts):
+    # Splits the grid rows evenly between the charts of the page and
+    # turns the bottom/left adjustments into grid cells reserved for the labels.
+    # The axes of every grid area are kept in page_axes and cleared for the next page using the same area.
+    for ax in page_axes.values():
+        ax.set_visible(False)
+
+    rows_per_chart = GRID_ROWS // len(charts)
+    for index, chart in enumerate(charts):
+        top = index * rows_per_chart + 1
+        bottom = (index + 1) * rows_per_chart - 1
+        if chart['bottom_adjustment']:
+            bottom -= round(rows_per_chart * chart['bottom_adjustment'])
+        left = round(GRID_COLUMNS * (chart['left_adjustment'] or 0.1))
+        area = (top, max(bottom, top + 1), left)
+        if area in page_axes:
+            ax = page_axes[area]
+            ax.clear()
+            ax.set_visible(True)
+        else:
+            ax = page_axes[area] = fig.add_subplot(gs[area[0]:area[1], area[2]:])
+        draw_chart(ax, chart)
+    pdf.savefig(fig, dpi=REPORT_DPI)
+
+
+def render_report(path, layout):
+    started = perf_counter()
+    with PdfPages(path) as pdf:
+        if layout == 'grid':
+            # One figure for the whole report
+            fig = plt.figure(figsize=PAGE_SIZE)
+            page_axes = {}
+            for charts in report_pages:
+                if charts:
+                    render_grid_page(pdf, fig, page_axes, charts)
+            plt.close(fig)
+        else:
+            for charts in report_pages:
+                for chart in charts:
+                    render_single_page(pdf, chart)
+    elapsed = perf_counter() - started
+    size = os.path.getsize(path)
+    print(f"{layout} layout: {elapsed:.2f}s, {size / 1024:.0f} KiB ({path})")
+    return elapsed, size
+
+
+def build_report_pages():
     # Customization options:
     # https://pandas.pydata.org/docs/reference/api/pandas.DataFrame.plot.html
     # https://pandas.pydata.org/docs/reference/api/pandas.plotting.table.html
@@ -421,6 +989,7 @@ with PdfPages('pdfoutput.pdf') as pdf:
     # - 2 -> Conversion to standard formats
 
     # Task 3:
+    start_chart_page()
     add_chart_plot(
         df=output_information['task_3']['toast_sales_by_hour'],
         title="#3-Sales by hour",
@@ -451,6 +1020,7 @@ with PdfPages('pdfoutput.pdf') as pdf:
 
     # Task 4:
     category_analysis_square = output_information['task_4']['category_analysis_square'].map(lambda x: round(x, 2))
+    start_chart_page()
     add_chart_plot(
         df=category_analysis_square.sort_values("Sales Volume", ascending=False).head(30),
         title="#4-Item Sales Volume",
@@ -472,6 +1042,7 @@ with PdfPages('pdfoutput.pdf') as pdf:
         x=None,
         y='Percentage of Total Sales'
     )
+    start_chart_page()
     add_chart_plot(
         df=output_information['task_4']['menu_item_analysis_toast'].sort_values("Sales Volume", ascending=False).head(30),
         title="#4-Menu Item Sales Volume",
@@ -497,6 +1068,7 @@ with PdfPages('pdfoutput.pdf') as pdf:
 
     # Task 5:
     for service_time in output_information['task_5']['service_category_analysis_toast']['Service'].unique():
+        start_chart_page()
         add_chart_plot(
             df=output_information['task_5']['service_category_analysis_toast'].query("`Service` == @service_time").sort_values('Sales Volume', ascending=False).head(30),
             title=f"#5-Sales Volume in {service_time} service",
@@ -524,6 +1096,7 @@ with PdfPages('pdfoutput.pdf') as pdf:
             bottom_adjustment=None,
             left_adjustment=0.5
         )
+        start_chart_page()
         for service_time in output_information['task_5']['service_category_analysis_toast']['Service'].unique():
             add_chart_plot(
                 df=output_information['task_5']['service_category_analysis_toast'].query("`Service` == @service_time").sort_values('Percentage of Total Sales', ascending=False).head(30),
@@ -535,6 +1108,7 @@ with PdfPages('pdfoutput.pdf') as pdf:
     # End of Task 5
 
     # Task 6:
+    start_chart_page()
     add_chart_plot(
         df=output_information['task_6']['top_dishes_toast_no_category'].sort_values('Gross Sales', ascending=False).head(30),
         title="#6-Top Dishes Sold",
@@ -553,6 +1127,7 @@ with PdfPages('pdfoutput.pdf') as pdf:
         bottom_adjustment=0.1,
         left_adjustment=0.5
     )
+    start_chart_page()
     add_chart_plot(
         df=output_information['task_6']['top_dishes_square'].sort_values('Gross Sales', ascending=False).head(30),
         title="#6-Top Dishes (with category) Sold",
@@ -576,6 +1151,7 @@ with PdfPages('pdfoutput.pdf') as pdf:
     # Task 7:
     # Note: @povilas -> Possible content about grouped index search
     for service_time in output_information['task_7']['top_dishes_by_service_toast'].index.get_level_values(0).unique():
+        start_chart_page()
         add_chart_plot(
             # Note: @povilas -> Possible content about grouped index search
             df=output_information['task_7']['top_dishes_by_service_toast'].query("index.to_series().str[0] == @service_time").sort_values('Gross Sales', ascending=False).head(30),
@@ -598,6 +1174,7 @@ with PdfPages('pdfoutput.pdf') as pdf:
     # End of Task 7
 
     # Task 8:
+    start_chart_page()
     add_chart_plot(
         df=output_information['task_8']['top_20_pairs_df'].sort_values('Frequency', ascending=False),
         title="#8-Top 20 pairs of items sold together - Frequency",
@@ -625,6 +1202,7 @@ with PdfPages('pdfoutput.pdf') as pdf:
         bottom_adjustment=None,
         left_adjustment=0.5
     )
+    start_chart_page()
     add_chart_plot(
         df=output_information['task_8']['top_20_pairs_toast_df'].sort_values('Frequency', ascending=False),
         title="#8-Top 20 pairs of items sold together - Frequency",
@@ -655,6 +1233,7 @@ with PdfPages('pdfoutput.pdf') as pdf:
     # End of Task 8
 
     # Task 9:
+    start_chart_page()
     add_chart_plot(
         df=output_information['task_9']['top_menu_group_pairs_corrected_df'].sort_values("Total Sales Volume", ascending=False),
         title="#9-Top Menu Group Pairs Sold Together",
@@ -676,6 +1255,7 @@ with PdfPages('pdfoutput.pdf') as pdf:
         x='Menu Group Pair',
         y='Frequency'
     )
+    start_chart_page()
     add_chart_plot(
         df=output_information['task_9']['top_menu_group_pairs_corrected_df'].sort_values('Frequency', ascending=False),
         title="#9-Top Menu Group Pairs - Frequency",
@@ -703,6 +1283,7 @@ with PdfPages('pdfoutput.pdf') as pdf:
         bottom_adjustment=None,
         left_adjustment=0.5
     )
+    start_chart_page()
     add_chart_plot(
         df=output_information['task_9']['top_category_pairs_df'].sort_values('Frequency', ascending=False),
         title="#9-Top 20 pairs of categories - Frequency",
@@ -731,3 +1312,207 @@ with PdfPages('pdfoutput.pdf') as pdf:
         left_adjustment=0.5
     )
     # End of Task 9
+
+    # Task 10:
+    for source in ['toast', 'square']:
+        item_trends = output_information['task_10'][f'{source}_item_trends']
+        start_chart_page()
+        add_chart_plot(
+            df=item_trends.head(15),
+            title=f"#10-Trending items ({source}) - Week over Week Change",
+            kind='barh',
+            x=None,
+            y='Week over Week Change',
+            bottom_adjustment=None,
+            left_adjustment=0.5
+        )
+        add_chart_plot(
+            df=item_trends.tail(15).sort_values('Week over Week Change'),
+            title=f"#10-Declining items ({source}) - Week over Week Change",
+            kind='barh',
+            x=None,
+            y='Week over Week Change',
+            bottom_adjustment=None,
+            left_adjustment=0.5
+        )
+        top_items = item_trends.sort_values('Last Week Sales', ascending=False).head(5).index
+        add_chart_plot(
+            df=output_information['task_10'][f'{source}_rolling_sales'][top_items],
+            # The rolling sales have no intervals in preview mode
+            title=f"#10-Rolling {TREND_WINDOW} day sales of the top items ({source})" + (" (not checked in preview)" if PREVIEW else ""),
+            kind='line',
+            x=None,
+            y=None,
+            show_legend=True,
+            bottom_adjustment=0.2
+        )
+    # End of Task 10
+
+
+def export_report(*task_outputs):
+    report_pages.clear()
+    build_report_pages()
+    report_elapsed, report_size = render_report(REPORT_PATH, REPORT_LAYOUT)
+
+    if COMPARE_LAYOUTS:
+        single_elapsed, single_size = render_report(REPORT_PATH.replace('.pdf', '-single.pdf'), 'single')
+        print(f"{REPORT_LAYOUT} vs single layout: {report_elapsed / single_elapsed:.0%} of the render time, {report_size / single_size:.0%} of the file size")
+
+
+# ==========================================
+
+# Task graph
+# Every node lists the nodes it needs, in the order their outputs are passed to its function.
+# Nodes are declared in dependency order, a node always comes after all of its inputs.
+TASK_GRAPH = {
+    'square_df': (load_square_df, []),
+    'toast_df': (load_toast_df, []),
+    'square_dine_in_df': (filter_square_dine_in, ['square_df']),
+    'toast_dine_in_df': (filter_toast_dine_in, ['toast_df']),
+    'task_2': (task_2, ['square_df', 'toast_df']),
+    'task_3': (task_3, ['task_2', 'toast_df']),
+    'task_4': (task_4, ['square_dine_in_df', 'toast_dine_in_df']),
+    'task_5': (task_5, ['toast_dine_in_df']),
+    'task_6': (task_6, ['square_dine_in_df', 'toast_dine_in_df']),
+    'task_7': (task_7, ['toast_dine_in_df']),
+    'task_8': (task_8, ['square_dine_in_df', 'toast_dine_in_df']),
+    'task_9': (task_9, ['square_dine_in_df', 'toast_dine_in_df']),
+    'task_10': (task_10, ['task_2']),
+    'preview': (preview_results, ['square_df', 'toast_df', 'task_3', 'task_4', 'task_5', 'task_6', 'task_7', 'task_8', 'task_9', 'task_10']),
+    'report': (export_report, ['task_2', 'task_3', 'task_4', 'task_5', 'task_6', 'task_7', 'task_8', 'task_9', 'task_10', 'preview'])
+}
+
+# Nodes drawing with pyplot, which is not thread safe and needs the main thread with the GUI backends
+MAIN_THREAD_NODES = {'report'}
+
+# Files read by the loading nodes, checked for changes in watch mode
+TASK_INPUT_FILES = {
+    'square_df': file_path_square,
+    'toast_df': file_path_toast
+}
+
+# Latest output of every node, kept between runs so that watch mode only re-runs what changed
+node_results = {}
+
+
+def run_task_node(name):
+    function, inputs = TASK_GRAPH[name]
+    started = perf_counter()
+    node_results[name] = function(*[node_results[node] for node in inputs])
+    if name.startswith('task_'):
+        # A copy, so that preview mode can replace the outputs without changing the ones kept for watch mode
+        output_information[name] = dict(node_results[name])
+    return perf_counter() - started
+
+
+def run_task_graph(names):
+    # Starts every node as soon as all of its inputs are done, up to MAX_WORKERS at a time.
+    # The MAIN_THREAD_NODES run here instead of on a worker.
+    pending = set(names)
+    running = {}
+    timings = {}
+    with ThreadPoolExecutor(max_workers=MAX_WORKERS) as executor:
+        while pending or running:
+            for name in [node for node in TASK_GRAPH if node in pending]:
+                inputs = TASK_GRAPH[name][1]
+                if not pending.intersection(inputs) and not set(running.values()).intersection(inputs):
+                    pending.remove(name)
+                    if name in MAIN_THREAD_NODES:
+                        timings[name] = run_task_node(name)
+                    else:
+                        running[executor.submit(run_task_node, name)] = name
+            if not running:
+                continue
+            done, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in done:
+                timings[running.pop(future)] = future.result()
+
+    print_task_timings(timings)
+    return timings
+
+
+def downstream_nodes(names):
+    # The given nodes and every node depending on them, directly or not
+    selected = set(names)
+    for name, (_, inputs) in TASK_GRAPH.items():
+        if selected.intersection(inputs):
+            selected.add(name)
+    return selected
+
+
+def critical_path(timings):
+    # Longest chain of dependent nodes, measured with the time each node took in this run
+    finished_at = {}
+    previous = {}
+    for name, (_, inputs) in TASK_GRAPH.items():
+        if name not in timings:
+            continue
+        slowest_input = max([node for node in inputs if node in finished_at], key=finished_at.get, default=None)
+        finished_at[name] = timings[name] + finished_at.get(slowest_input, 0)
+        previous[name] = slowest_input
+
+    name = max(finished_at, key=finished_at.get)
+    total = finished_at[name]
+    path = []
+    while name:
+        path.insert(0, name)
+        name = previous[name]
+    return path, total
+
+
+def print_task_timings(timings):
+    for name, elapsed in sorted(timings.items(), key=lambda item: item[1], reverse=True):
+        print(f"{name:<20}{elapsed:>8.2f}s")
+    path, total = critical_path(timings)
+    print(f"Critical path: {' -> '.join(path)} ({total:.2f}s)")
+
+
+def get_modified_time(path):
+    # A file can be missing for a moment while an export is being replaced
+    try:
+        return os.path.getmtime(path)
+    except FileNotFoundError:
+        return None
+
+
+def watch_data_files():
+    modified_times = {name: get_modified_time(path) for name, path in TASK_INPUT_FILES.items()}
+    print(f"Watching {', '.join(TASK_INPUT_FILES.values())} for changes, press Ctrl+C to stop")
+    try:
+        while True:
+            sleep(WATCH_INTERVAL)
+            changed = []
+            for name, path in TASK_INPUT_FILES.items():
+                modified_time = get_modified_time(path)
+                if modified_time is not None and modified_time != modified_times[name]:
+                    modified_times[name] = modified_time
+                    changed.append(name)
+            if not changed:
+                continue
+
+            print(f"Changed: {', '.join(TASK_INPUT_FILES[name] for name in changed)}")
+            try:
+                run_task_graph(downstream_nodes(changed))
+            except Exception as error:
+                # Keeps watching, the next change of the file will run the tasks again
+                print(f"Run failed: {error!r}")
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Exports the food sales analysis to a PDF file')
+    parser.add_argument('--watch', action='store_true', help='re-run the tasks depending on a data file whenever it changes')
+    parser.add_argument('--preview', action='store_true', help='quick report from a sample of the orders, with confidence intervals')
+    parser.add_argument('--compare-layouts', action='store_true', help='also render the one chart per page layout and compare render time and file size')
+    args = parser.parse_args()
+
+    if args.compare_layouts:
+        COMPARE_LAYOUTS = True
+    if args.preview:
+        PREVIEW = True
+        REPORT_PATH = 'pdfoutput-preview.pdf'
+
+    run_task_graph(TASK_GRAPH)
+    if args.watch:
+        watch_data_files()